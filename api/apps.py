@@ -1,6 +1,29 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Los logs de la API se encolan y un hilo aparte los escribe en stderr:
+        # la petición no espera a la E/S de la consola.
+        logger = logging.getLogger(self.name)
+        if any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers):
+            return  # ready() puede ejecutarse más de una vez
+        log_queue = queue.SimpleQueue()
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        # logger.debug solo en desarrollo
+        logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+        logger.propagate = False
@@ -1,25 +1,117 @@
 import bcrypt
 import jwt
-from datetime import datetime, timedelta
+import hashlib
+import hmac
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from .cache_utils import cache_get, cache_set
+
+# Argon2id opcional (argon2-cffi); sin él se sigue usando bcrypt
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+    HAS_ARGON2 = True
+except ImportError:
+    HAS_ARGON2 = False
 
 # Clave secreta (usa una variable de entorno en producción)
 SECRET_KEY = "CLIMETRICA_SECRET_KEY_2025"
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Caché de verificaciones de contraseña: (HMAC(password), hash) -> (expira, resultado).
+# Se guarda el HMAC y no la contraseña, para no dejar texto plano en memoria.
+VERIFY_CACHE_TTL = 30  # segundos
+VERIFY_CACHE_MAX = 1024
+_verify_cache = {}
 
-def check_password(password: str, hashed: str) -> bool:
+# Caché de JWT decodificados: SHA-256(token)[:16] -> (expira, payload). Nunca más allá
+# del 'exp' del token; la clave es un digest para no retener los tokens en memoria.
+JWT_CACHE_TTL = 30  # segundos
+JWT_CACHE_MAX = 10000
+_jwt_cache = {}
+
+# Argon2id: 2 pasadas sobre 64 MiB con 2 hilos. Cada hash en curso reserva esa
+# memoria, así que el pool de abajo también acota la RAM usada en picos.
+_argon2 = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2) if HAS_ARGON2 else None
+# Variante barata para datos de prueba/semilla (hash_password con cost < DEFAULT_COST);
+# needs_rehash la marca, así que esos hashes se actualizan en el primer login.
+_argon2_fast = PasswordHasher(time_cost=1, memory_cost=1024, parallelism=1) if HAS_ARGON2 else None
+DEFAULT_COST = 12
+
+# Pool compartido para los hash: las extensiones C (argon2/bcrypt) liberan el GIL, así
+# que basta con hilos (sin coste de serializar a otro proceso) y el pool limita los
+# hash simultáneos al número de núcleos en picos de login/registro.
+_hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="passwd")
+
+def _do_hash(password: str, cost: int) -> str:
+    if _argon2 is not None:
+        return (_argon2 if cost >= DEFAULT_COST else _argon2_fast).hash(password)
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cost)).decode('utf-8')
+
+def _do_check(password: str, hashed: str) -> bool:
+    if hashed.startswith("$argon2"):
+        if _argon2 is None:
+            return False
+        try:
+            return _argon2.verify(hashed, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    # Hashes bcrypt ($2b$...) de usuarios anteriores a Argon2id
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def hash_password(password: str, cost: int = DEFAULT_COST) -> str:
+    """
+    Argon2id si argon2-cffi está instalado; si no, bcrypt con `cost` rondas (2^cost
+    iteraciones). Bajar `cost` solo para datos de prueba/semilla, p. ej. cost=4: con
+    Argon2id usa entonces parámetros mínimos (1 pasada, 1 MiB).
+    """
+    return hash_password_async(password, cost).result()
+
+def hash_password_async(password: str, cost: int = DEFAULT_COST) -> Future:
+    """Como hash_password, pero devuelve el Future para solapar el hash con consultas a la BD."""
+    return _hash_pool.submit(_do_hash, password, cost)
+
+def needs_rehash(hashed: str) -> bool:
+    """True si el hash es bcrypt o Argon2id con parámetros distintos a los actuales."""
+    if _argon2 is None:
+        return False
+    if not hashed.startswith("$argon2"):
+        return True
+    try:
+        return _argon2.check_needs_rehash(hashed)
+    except InvalidHashError:
+        return True
+
+def check_password(password: str, hashed: str) -> bool:
+    key = (hmac.new(SECRET_KEY.encode('utf-8'), password.encode('utf-8'), hashlib.sha256).digest(), hashed)
+    cached = cache_get(_verify_cache, key)
+    if cached is not None:
+        return cached
+    result = _hash_pool.submit(_do_check, password, hashed).result()
+    cache_set(_verify_cache, key, result, time.time() + VERIFY_CACHE_TTL, VERIFY_CACHE_MAX)
+    return result
+
 def create_jwt(payload: dict, exp_minutes: int = 60):
     payload_copy = payload.copy()
-    payload_copy["exp"] = datetime.utcnow() + timedelta(minutes=exp_minutes)
+    payload_copy["exp"] = datetime.now(timezone.utc) + timedelta(minutes=exp_minutes)
     return jwt.encode(payload_copy, SECRET_KEY, algorithm="HS256")
 
 def decode_jwt(token: str):
+    # La verificación de la firma es determinista: un token ya validado puede reutilizarse
+    # hasta JWT_CACHE_TTL segundos, sin pasar nunca de su propio 'exp'.
+    key = hashlib.sha256(token.encode('utf-8')).digest()[:16]
+    cached = cache_get(_jwt_cache, key)
+    if cached is not None:
+        return cached
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    expires_at = time.time() + JWT_CACHE_TTL
+    if "exp" in payload:
+        expires_at = min(expires_at, payload["exp"])
+    cache_set(_jwt_cache, key, payload, expires_at, JWT_CACHE_MAX)
+    return payload
@@ -0,0 +1,25 @@
+# api/cache_utils.py
+# Cachés en memoria del proceso: dict clave -> (expira, valor) con expulsión FIFO.
+import threading
+import time
+
+_cache_lock = threading.Lock()
+
+def cache_get(cache, key):
+    """Devuelve el valor guardado si no ha expirado; None en otro caso."""
+    cached = cache.get(key)
+    if cached is not None and time.time() < cached[0]:
+        return cached[1]
+    return None
+
+def cache_set(cache, key, value, expires_at, max_entries):
+    with _cache_lock:
+        # expulsión FIFO: los dict conservan el orden de inserción
+        if key not in cache and len(cache) >= max_entries:
+            cache.pop(next(iter(cache)), None)
+        cache[key] = (expires_at, value)
+
+def cache_delete(cache, key):
+    # con el lock: un pop concurrente con la expulsión de cache_set rompería su iter()
+    with _cache_lock:
+        cache.pop(key, None)
@@ -1,22 +1,32 @@
 # api/dataset_utils.py
 import os
+import shutil
+import numpy as np
 import pandas as pd
 import json
-from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from itertools import islice
 from bson import ObjectId
 
 # Si usas geopandas:
 try:
     import geopandas as gpd
+    from shapely.geometry import mapping
     HAS_GPD = True
 except Exception:
     HAS_GPD = False
 
-from .mongodb import db, datasets_col # define en mongodb.py
+from .mongodb import db, datasets_col, observations_col # define en mongodb.py
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'uploads')
 UPLOAD_DIR = os.path.abspath(UPLOAD_DIR)
 
+# Inserción de observaciones: tamaño de lote y número de hilos insertando en paralelo
+OBSERVATIONS_BATCH_SIZE = 20000
+CSV_CHUNK_SIZE = 100_000
+INSERT_WORKERS = 4
+
 def ensure_upload_dir():
     if not os.path.exists(UPLOAD_DIR):
         os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -28,82 +38,185 @@ def save_uploaded_file(django_file):
     # evitar sobreescribir: añadir timestamp si ya existe
     if os.path.exists(safe_path):
         base, ext = os.path.splitext(filename)
-        filename = f"{base}_{int(datetime.utcnow().timestamp())}{ext}"
+        filename = f"{base}_{int(datetime.now(timezone.utc).timestamp())}{ext}"
         safe_path = os.path.join(UPLOAD_DIR, filename)
+    # Subidas grandes: Django ya las dejó en un archivo temporal en disco. Se copia
+    # con shutil.copyfile, que en Linux usa os.sendfile (copia dentro del kernel,
+    # sin pasar los datos por Python).
+    if hasattr(django_file, 'temporary_file_path'):
+        shutil.copyfile(django_file.temporary_file_path(), safe_path)
+        return safe_path, filename
     with open(safe_path, 'wb+') as dest:
         for chunk in django_file.chunks():
             dest.write(chunk)
     return safe_path, filename
 
-def parse_csv_and_store(path, dataset_doc):
+def _observation_records(frame, numeric_cols):
     """
-    Lee CSV con pandas, extrae resumen y guarda observaciones en coleccion 'observations'.
-    Se asume que hay una columna de fecha (name heurístico: 'date','timestamp','time').
+    Convierte las columnas numéricas a una lista de dicts (una por fila) de forma
+    vectorizada, sin iterrows. Los valores salen de un único ndarray float64 y las
+    claves con NaN se eliminan a partir de las posiciones que da np.nonzero(np.isnan(...)).
     """
-    df = pd.read_csv(path, parse_dates=True, infer_datetime_format=True)
-    # detectar columna de fecha
-    date_cols = [c for c in df.columns if c.lower() in ('date','timestamp','time','fecha')]
-    if date_cols:
-        date_col = date_cols[0]
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df.dropna(subset=[date_col])
-        df = df.sort_values(by=date_col)
-        dataset_doc['metadata']['date_column'] = date_col
-        dataset_doc['metadata']['start_date'] = str(df[date_col].min())
-        dataset_doc['metadata']['end_date'] = str(df[date_col].max())
-    else:
-        # si no hay fecha, crear índice incremental
-        date_col = None
+    values = frame[numeric_cols].to_numpy(dtype='float64', na_value=np.nan)
+    records = [dict(zip(numeric_cols, row)) for row in values.tolist()]
+    nan_rows, nan_cols = np.nonzero(np.isnan(values))
+    for i, j in zip(nan_rows.tolist(), nan_cols.tolist()):
+        del records[i][numeric_cols[j]]
+    return records
+
+def _insert_batch(docs):
+    observations_col.insert_many(docs, ordered=False, bypass_document_validation=True)
+
+def _insert_observations(docs):
+    """
+    Inserta las observaciones en lotes no ordenados de OBSERVATIONS_BATCH_SIZE,
+    repartidos entre INSERT_WORKERS hilos. `docs` puede ser un generador: cada lote
+    se toma con islice a medida que se produce, así el parseo se solapa con la
+    inserción y nunca existe la lista completa. Se mantienen como máximo dos lotes
+    por hilo en vuelo para no acumular memoria.
+    """
+    docs = iter(docs)
+    with ThreadPoolExecutor(max_workers=INSERT_WORKERS) as pool:
+        pending = set()
+        while True:
+            batch = list(islice(docs, OBSERVATIONS_BATCH_SIZE))
+            if not batch:
+                break
+            if len(pending) >= INSERT_WORKERS * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    fut.result()
+            pending.add(pool.submit(_insert_batch, batch))
+        for fut in pending:
+            fut.result()
 
-    # columnas numéricas (posibles variables climáticas)
-    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+def _update_stats(acc, frame, numeric_cols):
+    """
+    Acumula count/mean/M2/min/max por columna para un chunk, combinando con lo
+    ya acumulado (algoritmo paralelo de Welford/Chan), sin releer el archivo.
+    """
+    if not numeric_cols:
+        return
+    # una sola agregación vectorizada por chunk (NaN se ignoran)
+    agg = frame[numeric_cols].agg(['count', 'mean', 'min', 'max', 'var']).to_dict()
+    for col in numeric_cols:
+        col_agg = agg[col]
+        n_b = int(col_agg['count'])
+        if not n_b:
+            continue
+        mean_b = float(col_agg['mean'])
+        m2_b = float(col_agg['var']) * (n_b - 1) if n_b > 1 else 0.0
+        cur = acc.get(col)
+        if cur is None:
+            acc[col] = {"n": n_b, "mean": mean_b, "m2": m2_b, "min": float(col_agg['min']), "max": float(col_agg['max'])}
+            continue
+        n = cur["n"] + n_b
+        delta = mean_b - cur["mean"]
+        cur["mean"] += delta * n_b / n
+        cur["m2"] += m2_b + delta * delta * cur["n"] * n_b / n
+        cur["n"] = n
+        cur["min"] = min(cur["min"], float(col_agg['min']))
+        cur["max"] = max(cur["max"], float(col_agg['max']))
 
-    # calcular estadísticas básicas
+def _finalize_stats(acc, numeric_cols):
     stats = {}
     for col in numeric_cols:
-        ser = df[col].dropna()
+        cur = acc.get(col)
+        if cur is None:
+            stats[col] = {"mean": None, "min": None, "max": None, "std": None}
+            continue
         stats[col] = {
-            "mean": float(ser.mean()) if not ser.empty else None,
-            "min": float(ser.min()) if not ser.empty else None,
-            "max": float(ser.max()) if not ser.empty else None,
-            "std": float(ser.std()) if not ser.empty else None
+            "mean": cur["mean"],
+            "min": cur["min"],
+            "max": cur["max"],
+            "std": float(np.sqrt(cur["m2"] / (cur["n"] - 1))) if cur["n"] > 1 else None
         }
+    return stats
+
+def _iter_chunk_docs(chunk, dataset_id, numeric_cols, date_col):
+    records = _observation_records(chunk, numeric_cols)
+    # pd.Timestamp es subclase de datetime: BSON lo codifica directamente
+    ts_list = chunk[date_col].tolist() if date_col else None
+    lonlat = None
+    # si tenemos lat/lon en columnas
+    if 'lat' in chunk.columns and 'lon' in chunk.columns:
+        lonlat = chunk[['lon', 'lat']].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+        # el índice 2dsphere rechaza puntos fuera de rango (y con ellos todo el lote):
+        # esas filas se guardan sin 'location'
+        valid_loc = (
+            np.isfinite(lonlat).all(axis=1)
+            & (np.abs(lonlat[:, 0]) <= 180)
+            & (np.abs(lonlat[:, 1]) <= 90)
+        )
+        lonlat = lonlat.tolist()
+    for i, doc in enumerate(records):
+        doc['dataset_id'] = dataset_id
+        if ts_list is not None:
+            doc['timestamp'] = ts_list[i]
+        if lonlat is not None and valid_loc[i]:
+            doc['location'] = {"type": "Point", "coordinates": lonlat[i]}
+        yield doc
 
-    dataset_doc['metadata']['columns'] = df.columns.tolist()
-    dataset_doc['stats'] = stats
+def parse_csv_and_store(path, dataset_doc):
+    """
+    Lee CSV con pandas, extrae resumen y guarda observaciones en coleccion 'observations'.
+    Se asume que hay una columna de fecha (name heurístico: 'date','timestamp','time').
+    El archivo se procesa por chunks (pd.read_csv con chunksize): la memoria no depende del
+    tamaño del archivo y las estadísticas se acumulan chunk a chunk.
+    """
+    # detectar columna de fecha a partir de la cabecera
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    date_cols = [c for c in columns if c.lower() in ('date','timestamp','time','fecha')]
+    # si no hay fecha, crear índice incremental
+    date_col = date_cols[0] if date_cols else None
     dataset_id = dataset_doc['_id']
+    # instante de ingesta común a toda la carga (una sola lectura del reloj)
+    ingested_at = datetime.now(timezone.utc)
+
+    acc = {}
+    summary = {"numeric_cols": None, "rows": 0, "start": None, "end": None}
+
+    def chunk_docs():
+        for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_SIZE):
+            # columnas numéricas (posibles variables climáticas), según el primer chunk
+            if summary["numeric_cols"] is None:
+                summary["numeric_cols"] = [c for c in chunk.select_dtypes(include=['number']).columns if c != date_col]
+            numeric_cols = summary["numeric_cols"]
+            # un chunk posterior puede traer texto en una columna numérica
+            for col in numeric_cols:
+                if not pd.api.types.is_numeric_dtype(chunk[col]):
+                    chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+            if date_col:
+                chunk[date_col] = pd.to_datetime(chunk[date_col], errors='coerce')
+                chunk = chunk.dropna(subset=[date_col])
+                if chunk.empty:
+                    continue
+                chunk = chunk.sort_values(by=date_col)
+                first, last = chunk[date_col].iloc[0], chunk[date_col].iloc[-1]
+                summary["start"] = first if summary["start"] is None else min(summary["start"], first)
+                summary["end"] = last if summary["end"] is None else max(summary["end"], last)
+            summary["rows"] += len(chunk)
+            _update_stats(acc, chunk, numeric_cols)
+            yield from _iter_chunk_docs(chunk, dataset_id, numeric_cols, date_col)
 
-    # Guardar observaciones: un documento por fila (optimizar para volumen)
-    docs = []
-    for _, row in df.iterrows():
-        doc = {"dataset_id": dataset_id}
-        if date_col:
-            dt = row[date_col]
-            if pd.isnull(dt):
-                continue
-            doc['timestamp'] = dt.to_pydatetime()
-        # si tenemos lat/lon en columnas
-        if 'lat' in df.columns and 'lon' in df.columns:
-            try:
-                doc['location'] = {"type": "Point", "coordinates": [float(row['lon']), float(row['lat'])]}
-            except Exception:
-                pass
-        # añadir variables numéricas
-        for col in numeric_cols:
-            val = row[col]
-            if pd.isnull(val):
-                continue
-            doc[col] = float(val)
-        docs.append(doc)
-        # Insert in batches para grandes archivos
-        if len(docs) >= 1000:
-            observations_col.insert_many(docs)
-            docs = []
-    if docs:
-        observations_col.insert_many(docs)
+    # Guardar observaciones: un documento por fila, insertando en lotes según se generan.
+    # Si falla a mitad (lectura o inserción), se borran las ya insertadas de este dataset
+    # para no dejar una carga parcial.
+    try:
+        _insert_observations(chunk_docs())
+    except Exception:
+        observations_col.delete_many({"dataset_id": dataset_id})
+        raise
+
+    if date_col:
+        dataset_doc['metadata']['date_column'] = date_col
+        dataset_doc['metadata']['start_date'] = str(summary["start"])
+        dataset_doc['metadata']['end_date'] = str(summary["end"])
+    dataset_doc['metadata']['columns'] = columns
+    dataset_doc['stats'] = _finalize_stats(acc, summary["numeric_cols"] or [])
 
     # Guardar back metadata en datasets_col
-    datasets_col.update_one({"_id": dataset_id}, {"$set": {"metadata": dataset_doc['metadata'], "stats": dataset_doc['stats'], "row_count": len(df)}})
+    datasets_col.update_one({"_id": dataset_id}, {"$set": {"metadata": dataset_doc['metadata'], "stats": dataset_doc['stats'], "row_count": summary["rows"], "ingested_at": ingested_at}})
 
     return dataset_doc
 
@@ -115,35 +228,22 @@ def parse_geojson_and_store(path, dataset_doc):
         date_cols = [c for c in gdf.columns if c.lower() in ('date','timestamp','time','fecha')]
         date_col = date_cols[0] if date_cols else None
         numeric_cols = gdf.select_dtypes(include=['number']).columns.tolist()
-        stats = {}
-        for col in numeric_cols:
-            ser = gdf[col].dropna()
-            stats[col] = {"mean": float(ser.mean()) if not ser.empty else None, "min": float(ser.min()) if not ser.empty else None}
+        agg = gdf[numeric_cols].agg(['mean', 'min']).to_dict() if numeric_cols else {}
+        stats = {col: {k: (None if pd.isna(v) else float(v)) for k, v in agg[col].items()} for col in numeric_cols}
         dataset_doc['metadata']['columns'] = gdf.columns.tolist()
         dataset_doc['stats'] = stats
         dataset_id = dataset_doc['_id']
-        docs = []
-        for _, row in gdf.iterrows():
-            doc = {"dataset_id": dataset_id}
-            if date_col:
-                dt = row[date_col]
-                doc['timestamp'] = pd.to_datetime(dt).to_pydatetime()
-            # geometry
-            geom = row.geometry
+        records = _observation_records(gdf, numeric_cols)
+        ts_list = pd.to_datetime(gdf[date_col]).tolist() if date_col else None
+        for i, (doc, geom) in enumerate(zip(records, gdf.geometry)):
+            doc['dataset_id'] = dataset_id
+            if ts_list is not None:
+                doc['timestamp'] = ts_list[i]
+            # geometry: mapping() da el dict GeoJSON directamente, sin pasar por un str JSON
             if geom is not None:
-                doc['geometry'] = json.loads(geom.to_json())
-            for col in numeric_cols:
-                val = row[col]
-                if pd.isnull(val):
-                    continue
-                doc[col] = float(val)
-            docs.append(doc)
-            if len(docs) >= 500:
-                observations_col.insert_many(docs)
-                docs = []
-        if docs:
-            observations_col.insert_many(docs)
-        datasets_col.update_one({"_id": dataset_id}, {"$set": {"metadata": dataset_doc['metadata'], "stats": dataset_doc['stats'], "row_count": len(gdf)}})
+                doc['geometry'] = mapping(geom)
+        _insert_observations(records)
+        datasets_col.update_one({"_id": dataset_id}, {"$set": {"metadata": dataset_doc['metadata'], "stats": dataset_doc['stats'], "row_count": len(gdf), "ingested_at": datetime.now(timezone.utc)}})
         return dataset_doc
     else:
         # Fallback: leer como JSON y guardar features
@@ -164,11 +264,7 @@ def parse_geojson_and_store(path, dataset_doc):
                 except Exception:
                     doc[k] = v
             docs.append(doc)
-            if len(docs) >= 500:
-                observations_col.insert_many(docs)
-                docs = []
-        if docs:
-            observations_col.insert_many(docs)
+        _insert_observations(docs)
         dataset_doc['metadata']['columns'] = list(features[0].get('properties', {}).keys()) if features else []
-        datasets_col.update_one({"_id": dataset_id}, {"$set": {"metadata": dataset_doc['metadata'], "row_count": len(features)}})
+        datasets_col.update_one({"_id": dataset_id}, {"$set": {"metadata": dataset_doc['metadata'], "row_count": len(features), "ingested_at": datetime.now(timezone.utc)}})
         return dataset_doc
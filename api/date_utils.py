@@ -0,0 +1,40 @@
+# api/date_utils.py
+# Fechas de serieTemporal: conversión a datetime (campo 'timestamp') e intervalos de filtro.
+from datetime import datetime, timedelta
+
+
+# ----------------------------
+# Fecha de un punto de serieTemporal como datetime
+# ----------------------------
+def parse_serie_date(value):
+    """
+    Convierte el texto 'date' de un punto de la serie a datetime para poder indexarlo.
+    Se conserva la hora local del texto (sin zona) para que el filtro por día
+    coincida con el prefijo de la fecha tal como la envió el frontend.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def fecha_range(fecha):
+    """
+    Intervalo [inicio, fin) del día, mes o año indicado en `fecha`
+    (YYYY-MM-DD, YYYY-MM o YYYY); None si no tiene ninguno de esos formatos.
+    """
+    for fmt in ('%Y-%m-%d', '%Y-%m', '%Y'):
+        try:
+            start = datetime.strptime(fecha, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d':
+            end = start + timedelta(days=1)
+        elif fmt == '%Y-%m':
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        else:
+            end = start.replace(year=start.year + 1)
+        return start, end
+    return None
@@ -1,5 +1,7 @@
 from functools import wraps
-from django.http import JsonResponse
+from bson import ObjectId
+from bson.errors import InvalidId
+from .responses import OrjsonResponse
 from .auth_utils import decode_jwt
 
 # ----------------------------
@@ -10,11 +12,17 @@ def jwt_required(view_func):
     def wrapper(request, *args, **kwargs):
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
-            return JsonResponse({"error": "Token no proporcionado"}, status=401)
+            return OrjsonResponse({"error": "Token no proporcionado"}, status=401)
         token = auth_header.split(" ")[1]
         payload = decode_jwt(token)
         if not payload:
-            return JsonResponse({"error": "Token inválido o expirado"}, status=401)
+            return OrjsonResponse({"error": "Token inválido o expirado"}, status=401)
+        # ObjectId del usuario convertido una sola vez; las vistas usan request.user["_oid"]
+        if "_oid" not in payload:
+            try:
+                payload["_oid"] = ObjectId(payload.get("user_id"))
+            except (InvalidId, TypeError):
+                return OrjsonResponse({"error": "Token inválido o expirado"}, status=401)
         request.user = payload
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -28,8 +36,8 @@ def admin_required(view_func):
     def wrapper(request, *args, **kwargs):
         user = getattr(request, "user", None)
         if not user:
-            return JsonResponse({"error": "No autorizado"}, status=401)
+            return OrjsonResponse({"error": "No autorizado"}, status=401)
         if user.get("role") != "admin":
-            return JsonResponse({"error": "Acceso denegado: se requiere rol admin"}, status=403)
+            return OrjsonResponse({"error": "Acceso denegado: se requiere rol admin"}, status=403)
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -0,0 +1,54 @@
+# api/management/commands/migrate_mongo.py
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from api.mongodb import climate_data_col, ensure_indexes, users_col
+from api.date_utils import parse_serie_date
+
+# Registros de climate_data actualizados por cada bulk_write
+BACKFILL_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Rellena los campos derivados de MongoDB (email_lc, serieTemporal.timestamp) y crea los índices de la API."
+
+    def handle(self, *args, **options):
+        try:
+            # Usuarios creados antes de email_lc: rellenar el campo normalizado (pipeline, MongoDB >= 4.2)
+            result = users_col.update_many(
+                {"email_lc": {"$exists": False}, "email": {"$type": "string"}},
+                [{"$set": {"email_lc": {"$toLower": "$email"}}}]
+            )
+            self.stdout.write(f"email_lc rellenado en {result.modified_count} usuarios")
+            self.stdout.write(f"timestamp rellenado en {self.backfill_serie_timestamps()} registros climáticos")
+            # Falla si hay emails que solo difieren en mayúsculas: hay que resolverlos a mano
+            ensure_indexes()
+        except PyMongoError as e:
+            raise CommandError(f"Migración de MongoDB incompleta: {e}") from e
+        self.stdout.write(self.style.SUCCESS("Migración de MongoDB completada"))
+
+    def backfill_serie_timestamps(self):
+        """
+        Añade 'timestamp' a los puntos de serieTemporal guardados antes de ese campo,
+        con la misma conversión que save_climate_data. Los puntos cuya fecha no se
+        puede interpretar quedan con timestamp null, para no volver a procesarlos.
+        """
+        cursor = climate_data_col.find(
+            {"datosClimaticos.serieTemporal": {"$elemMatch": {"timestamp": {"$exists": False}}}},
+            {"datosClimaticos.serieTemporal": 1}
+        ).batch_size(BACKFILL_BATCH_SIZE)
+        ops = []
+        updated = 0
+        for doc in cursor:
+            serie = doc["datosClimaticos"]["serieTemporal"]
+            for punto in serie:
+                if isinstance(punto, dict) and "timestamp" not in punto:
+                    punto["timestamp"] = parse_serie_date(punto.get("date"))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"datosClimaticos.serieTemporal": serie}}))
+            if len(ops) >= BACKFILL_BATCH_SIZE:
+                updated += climate_data_col.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += climate_data_col.bulk_write(ops, ordered=False).modified_count
+        return updated
@@ -1,17 +1,96 @@
 # api/mongodb.py
+import pymongo
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+import logging
 import os
 import gridfs
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/climetricadb")
-client = MongoClient(MONGO_URI)
+# Pool dimensionado para los hilos de un worker de Django; compresión de protocolo
+# (zstd si está instalado, zlib siempre disponible) para las series climáticas grandes.
+# pymongo >= 4.3 reinicia el pool en el hijo tras un fork (workers de gunicorn).
+client = MongoClient(
+    MONGO_URI,
+    maxPoolSize=50,
+    minPoolSize=10,
+    compressors="zstd,zlib",
+    w=1,
+    retryWrites=True,
+)
 db = client.get_default_database()  # o client['climetrica_db']
 users_col = db['users']
 config_col = db['system_config']
 climate_data_col = db["climate_data"] 
+datasets_col = db['datasets']
+observations_col = db['observations']
 
 # 🔹 GridFS handler
-fs = gridfs.GridFS(db)
\ No newline at end of file
+fs = gridfs.GridFS(db)
+
+
+def ensure_indexes():
+    """
+    Crea los índices que usan las consultas de la API. create_index es idempotente,
+    así que puede ejecutarse en cada arranque/worker. El relleno de datos antiguos
+    se hace aparte, con `python manage.py migrate_mongo`.
+    """
+    # Índices parciales: los documentos sin email/identificación no chocan entre sí
+    users_col.create_index("email_lc", unique=True, partialFilterExpression={"email_lc": {"$type": "string"}})
+    users_col.create_index("identification", unique=True, partialFilterExpression={"identification": {"$type": "string"}})
+    # Filtro de get_climate_data por usuario + fecha de la serie temporal (multikey);
+    # el prefijo usuario._id sirve también a las consultas solo por usuario
+    climate_data_col.create_index([("usuario._id", 1), ("datosClimaticos.serieTemporal.timestamp", 1)])
+    # Observaciones de datasets: serie de un dataset por fecha y consultas espaciales
+    observations_col.create_index([("dataset_id", 1), ("timestamp", 1)])
+    observations_col.create_index([("location", "2dsphere")])
+
+
+# Se pone a True en cuanto se comprueba que no quedan usuarios sin email_lc
+# (ver `manage.py migrate_mongo`); desde entonces no se vuelve a consultar.
+_email_lc_backfilled = False
+
+def email_lc_backfilled():
+    """True si todos los usuarios con email tienen ya el campo email_lc."""
+    global _email_lc_backfilled
+    if not _email_lc_backfilled:
+        pending = users_col.find_one({"email_lc": {"$exists": False}, "email": {"$type": "string"}}, {"_id": 1})
+        _email_lc_backfilled = pending is None
+    return _email_lc_backfilled
+
+
+_user_indexes_ready = False
+
+def user_indexes_ready():
+    """
+    True si los índices únicos de email_lc e identification existen y no quedan
+    usuarios sin email_lc, es decir, si la BD rechaza por sí sola los duplicados.
+    Como email_lc_backfilled, se guarda en cuanto se confirma.
+    """
+    global _user_indexes_ready
+    if not _user_indexes_ready:
+        unique_keys = {
+            tuple(field for field, _ in info["key"])
+            for info in users_col.index_information().values() if info.get("unique")
+        }
+        _user_indexes_ready = (
+            ("email_lc",) in unique_keys
+            and ("identification",) in unique_keys
+            and email_lc_backfilled()
+        )
+    return _user_indexes_ready
+
+
+try:
+    # límite corto: si MongoDB no está disponible, no bloquear el arranque 30 s
+    with pymongo.timeout(5):
+        ensure_indexes()
+except PyMongoError as e:
+    # antes de ApiConfig.ready() lo escribe en stderr el handler de último recurso de logging
+    logger.warning("No se pudieron crear los índices de MongoDB: %s", e)
+
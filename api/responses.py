@@ -0,0 +1,14 @@
+# api/responses.py
+import orjson
+from django.http import HttpResponse
+
+
+class OrjsonResponse(HttpResponse):
+    """
+    Equivalente a JsonResponse pero serializando con orjson (extensión en C).
+    datetime se serializa de forma nativa; ObjectId y otros tipos no JSON con str().
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=orjson.dumps(data, default=str), **kwargs)
@@ -1,77 +1,134 @@
-from django.http import JsonResponse
+from django.http import StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+import itertools
 import json
-from datetime import datetime
+import logging
+import orjson
+import re
+import time
+from datetime import datetime, timezone
 from bson import ObjectId
-from .mongodb import users_col
-from .auth_utils import hash_password, check_password, create_jwt
+from bson.errors import InvalidId
+from bson.regex import Regex
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .mongodb import users_col, email_lc_backfilled, user_indexes_ready
+from .auth_utils import hash_password, hash_password_async, check_password, needs_rehash, create_jwt
 from .decorators import jwt_required, admin_required
-import traceback
+from .responses import OrjsonResponse
+from .cache_utils import cache_get, cache_set, cache_delete
+from .date_utils import parse_serie_date, fecha_range
 from .mongodb import climate_data_col
 
+logger = logging.getLogger(__name__)
+
+# Caché de perfiles (ya sanitizados) por user_id para `profile`; se invalida al
+# actualizar o eliminar el usuario en este proceso.
+USER_CACHE_TTL = 60  # segundos
+USER_CACHE_MAX = 5000
+_user_cache = {}
 
 
 # ----------------------------
 # Limpieza del usuario antes de devolverlo
 # ----------------------------
+# Campos internos que nunca salen de la BD: se excluyen en la propia consulta
+USER_PROJECTION = {"password_hash": 0, "email_lc": 0}
+
 def sanitize_user(u):
+    """Prepara un usuario leído con USER_PROJECTION para la respuesta."""
     if not u:
         return None
-    u.pop('password_hash', None)
     u['_id'] = str(u['_id'])
     return u
 
 
+def duplicate_user_response(error):
+    """Respuesta 400 para un DuplicateKeyError de los índices únicos de usuarios."""
+    if "identification" in (error.details or {}).get("keyPattern", {}):
+        return OrjsonResponse({"error": "Ya existe un usuario registrado con esa identificación"}, status=400)
+    return OrjsonResponse({"error": "Ya existe un usuario registrado con ese correo electrónico"}, status=400)
+
+
+def get_users_by_ids(ids):
+    """
+    Usuarios (sanitizados) por id en una sola consulta $in, para operaciones masivas
+    en lugar de un find_one por id. Devuelve {id: usuario}; los ids inválidos o
+    inexistentes no aparecen.
+    """
+    oids = []
+    for i in ids:
+        try:
+            oids.append(ObjectId(i))
+        except (InvalidId, TypeError):
+            continue
+    if not oids:
+        return {}
+    cursor = users_col.find({"_id": {"$in": oids}}, USER_PROJECTION).batch_size(len(oids))
+    return {u["_id"]: u for u in map(sanitize_user, cursor)}
+
+
 # ============================
 # Registro de usuario
 # ============================
 @csrf_exempt
 def register(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
     try:
         body = json.loads(request.body)
-        print("BODY RECIBIDO:", body)
 
         email = body.get("email")
         identification = body.get("identification")
 
-        # Validar email duplicado (case-insensitive)
         email_lower = email.lower() if email else None
-        existing_email = users_col.find_one({"email": {"$regex": f"^{email_lower}$", "$options": "i"}})
-        if existing_email:
-            return JsonResponse({"error": "Ya existe un usuario registrado con ese correo electrónico"}, status=400)
 
-        # Validar identificación duplicada
-        if identification:
-            existing_identification = users_col.find_one({"identification": identification})
-            if existing_identification:
-                return JsonResponse({"error": "Ya existe un usuario registrado con esa identificación"}, status=400)
+        # El hash (en el pool de auth_utils) se calcula mientras se comprueban índices y duplicados
+        password_future = hash_password_async(body.get("password"))
+
+        # Sin los índices únicos (creación fallida o migración pendiente) se validan
+        # los duplicados con consultas, como respaldo
+        if not user_indexes_ready():
+            if email and users_col.find_one({"$or": [
+                {"email_lc": email_lower},
+                {"email_lc": {"$exists": False}, "email": Regex(f'^{re.escape(email)}$', 'i')},
+            ]}, {"_id": 1}):
+                return OrjsonResponse({"error": "Ya existe un usuario registrado con ese correo electrónico"}, status=400)
+            if identification and users_col.find_one({"identification": identification}, {"_id": 1}):
+                return OrjsonResponse({"error": "Ya existe un usuario registrado con esa identificación"}, status=400)
 
-        password_hash = hash_password(body.get("password"))
+        password_hash = password_future.result()
+        now = datetime.now(timezone.utc)
 
         user = {
             "first_name": body.get("first_name"),
             "last_name": body.get("last_name"),
             "email": email,
+            "email_lc": email_lower,
             "phone": body.get("phone"),
             "identification": identification,
             "role": body.get("role", "productor"),
             "status": "active",
             "password_hash": password_hash,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
+            "created_at": now,
+            "updated_at": now,
             "must_change_password": False
         }
 
-        result = users_col.insert_one(user)
+        # Con los índices únicos de email_lc e identification (ver mongodb.ensure_indexes)
+        # los duplicados los detecta el insert: un solo viaje a la BD y sin carrera
+        try:
+            result = users_col.insert_one(user)
+        except DuplicateKeyError as e:
+            return duplicate_user_response(e)
         user["_id"] = str(result.inserted_id)
         user.pop("password_hash")
-        return JsonResponse({"user": user}, status=201)
+        user.pop("email_lc")
+        return OrjsonResponse({"user": user}, status=201)
 
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": f"Error al registrar usuario: {str(e)}"}, status=500)
+        logger.exception("Error en register")
+        return OrjsonResponse({"error": f"Error al registrar usuario: {str(e)}"}, status=500)
 
 
 # ============================
@@ -80,32 +137,53 @@ def register(request):
 @csrf_exempt
 def login(request):
     if request.method != "POST":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
     try:
         body = json.loads(request.body)
         email = body.get("email")
         password = body.get("password")
 
-        # Convertir email a minúsculas para búsqueda case-insensitive
-        email_lower = email.lower() if email else None
+        # Sin email no se consulta: {"email_lc": None} coincidiría con cualquier usuario sin el campo
+        if not email or not isinstance(email, str) or not password:
+            return OrjsonResponse({"error": "Credenciales inválidas"}, status=401)
 
-        # Usar regex case-insensitive para búsqueda de email
-        user = users_col.find_one({"email": {"$regex": f"^{email_lower}$", "$options": "i"}})
-        if not user or not check_password(password, user["password_hash"]):
-            return JsonResponse({"error": "Credenciales inválidas"}, status=401)
+        # Convertir email a minúsculas para búsqueda case-insensitive
+        email_lower = email.lower()
+
+        # Búsqueda por igualdad sobre email_lc (usa el índice único).
+        # Solo los campos necesarios para autenticar; el documento completo se lee tras validar.
+        auth_projection = {"_id": 1, "email": 1, "role": 1, "password_hash": 1}
+        auth = users_col.find_one({"email_lc": email_lower}, auth_projection)
+        if not auth and not email_lc_backfilled():
+            # Usuarios antiguos aún sin email_lc (pendiente `manage.py migrate_mongo`)
+            auth = users_col.find_one(
+                {"email_lc": {"$exists": False}, "email": Regex(f'^{re.escape(email)}$', 'i')},
+                auth_projection
+            )
+        if not auth or not check_password(password, auth["password_hash"]):
+            return OrjsonResponse({"error": "Credenciales inválidas"}, status=401)
+
+        # Migración progresiva: hashes bcrypt o Argon2id con parámetros antiguos se
+        # recalculan ahora que se conoce la contraseña (solo si nadie la cambió entretanto)
+        if needs_rehash(auth["password_hash"]):
+            users_col.update_one(
+                {"_id": auth["_id"], "password_hash": auth["password_hash"]},
+                {"$set": {"password_hash": hash_password(password)}}
+            )
 
         token = create_jwt({
-            "user_id": str(user["_id"]),
-            "email": user["email"],
-            "role": user["role"]
+            "user_id": str(auth["_id"]),
+            "email": auth["email"],
+            "role": auth["role"]
         })
 
-        sanitized_user = sanitize_user(user.copy())
-        return JsonResponse({"token": token, "user": sanitized_user}, status=200)
+        user = users_col.find_one({"_id": auth["_id"]}, USER_PROJECTION)
+        sanitized_user = sanitize_user(user)
+        return OrjsonResponse({"token": token, "user": sanitized_user}, status=200)
 
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": f"Error al iniciar sesión: {str(e)}"}, status=500)
+        logger.exception("Error en login")
+        return OrjsonResponse({"error": f"Error al iniciar sesión: {str(e)}"}, status=500)
 
 
 # ============================
@@ -118,16 +196,21 @@ def profile(request):
     Esto incluye first_name y last_name.
     """
     try:
-        user = users_col.find_one(
-            {"_id": ObjectId(request.user["user_id"])},
-            {"password_hash": 0}  # Excluir password
-        )
-        if not user:
-            return JsonResponse({"error": "Usuario no encontrado"}, status=404)
-        return JsonResponse({"user": sanitize_user(user)}, status=200)
+        user_id = request.user["user_id"]
+        user = cache_get(_user_cache, user_id)
+        if user is None:
+            user = users_col.find_one(
+                {"_id": request.user["_oid"]},
+                USER_PROJECTION  # Excluir password y email_lc
+            )
+            if not user:
+                return OrjsonResponse({"error": "Usuario no encontrado"}, status=404)
+            user = sanitize_user(user)
+            cache_set(_user_cache, user_id, user, time.time() + USER_CACHE_TTL, USER_CACHE_MAX)
+        return OrjsonResponse({"user": user}, status=200)
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("Error en profile")
+        return OrjsonResponse({"error": str(e)}, status=500)
 
 
 # ============================
@@ -142,42 +225,55 @@ def update_own_profile(request):
     Puede modificar: first_name, last_name, email, phone, password
     """
     if request.method != "PUT":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
     try:
         body = json.loads(request.body)
-        user_id = request.user["user_id"]
+        user_oid = request.user["_oid"]
 
         # Campos permitidos para actualizar
         allowed_fields = ["first_name", "last_name", "email", "phone"]
         update_fields = {k: v for k, v in body.items() if k in allowed_fields}
+        if "email" in update_fields and (not update_fields["email"] or not isinstance(update_fields["email"], str)):
+            return OrjsonResponse({"error": "Correo electrónico inválido"}, status=400)
+
+        # El hash de la nueva contraseña se calcula mientras se valida el email
+        password_future = hash_password_async(body["password"]) if body.get("password") else None
 
         # Validar email duplicado si se está cambiando
         if "email" in update_fields:
             email_lower = update_fields["email"].lower()
             existing_email = users_col.find_one({
-                "email": {"$regex": f"^{email_lower}$", "$options": "i"},
-                "_id": {"$ne": ObjectId(user_id)}
+                "email_lc": email_lower,
+                "_id": {"$ne": user_oid}
             })
             if existing_email:
-                return JsonResponse({"error": "Ya existe otro usuario con ese correo electrónico"}, status=400)
+                return OrjsonResponse({"error": "Ya existe otro usuario con ese correo electrónico"}, status=400)
+            update_fields["email_lc"] = email_lower
 
         # Manejar cambio de contraseña
-        if body.get("password"):
-            update_fields["password_hash"] = hash_password(body["password"])
+        if password_future is not None:
+            update_fields["password_hash"] = password_future.result()
 
         # Agregar timestamp de actualización
-        update_fields["updated_at"] = datetime.utcnow()
-
-        # Actualizar usuario
-        users_col.update_one({"_id": ObjectId(user_id)}, {"$set": update_fields})
-
-        # Obtener usuario actualizado
-        user = sanitize_user(users_col.find_one({"_id": ObjectId(user_id)}))
+        update_fields["updated_at"] = datetime.now(timezone.utc)
+
+        # Actualizar usuario y obtenerlo ya actualizado en un solo viaje a la BD
+        user = users_col.find_one_and_update(
+            {"_id": user_oid},
+            {"$set": update_fields},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        cache_delete(_user_cache, request.user["user_id"])
+        if not user:
+            return OrjsonResponse({"error": "Usuario no encontrado"}, status=404)
 
-        return JsonResponse({"user": user}, status=200)
+        return OrjsonResponse({"user": sanitize_user(user)}, status=200)
+    except DuplicateKeyError as e:
+        return duplicate_user_response(e)
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("Error en update_own_profile")
+        return OrjsonResponse({"error": str(e)}, status=500)
 
 
 # ============================
@@ -189,13 +285,29 @@ def update_own_profile(request):
 @admin_required
 def list_users(request):
     if request.method != "GET":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
     try:
-        users = [sanitize_user(u) for u in users_col.find()]
-        return JsonResponse({"users": users}, status=200)
+        # Sin sanitize_user: la proyección ya excluye hash y email_lc, y
+        # orjson convierte el ObjectId con default=str
+        cursor = users_col.find({}, USER_PROJECTION).batch_size(1000)
+        # find es perezoso: se lee el primer usuario aquí para que un error de MongoDB
+        # dé un 500 en JSON y no una respuesta 200 truncada
+        first_user = next(cursor, None)
+
+        # Se serializa usuario a usuario: memoria constante y primer byte inmediato
+        def stream():
+            yield b'{"users":['
+            if first_user is not None:
+                yield orjson.dumps(first_user, default=str)
+                for u in cursor:
+                    yield b','
+                    yield orjson.dumps(u, default=str)
+            yield b']}'
+
+        return StreamingHttpResponse(stream(), content_type="application/json", status=200)
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("Error en list_users")
+        return OrjsonResponse({"error": str(e)}, status=500)
 
 
 # Actualizar usuario por ID (solo admin)
@@ -204,18 +316,34 @@ def list_users(request):
 @csrf_exempt
 def update_user(request, user_id):
     if request.method != "PUT":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
+    try:
+        # Se valida el ID antes de nada: un ID inválido no llega a calcular el hash
+        user_oid = ObjectId(user_id)
+    except InvalidId:
+        return OrjsonResponse({"error": "ID de usuario inválido"}, status=400)
     try:
         body = json.loads(request.body)
-        update_fields = {k: v for k, v in body.items() if k != "password"}
+        update_fields = {k: v for k, v in body.items() if k not in ("password", "email_lc")}
+        if isinstance(update_fields.get("email"), str):
+            update_fields["email_lc"] = update_fields["email"].lower()
         if body.get("password"):
             update_fields["password_hash"] = hash_password(body["password"])
-        users_col.update_one({"_id": ObjectId(user_id)}, {"$set": update_fields})
-        user = sanitize_user(users_col.find_one({"_id": ObjectId(user_id)}))
-        return JsonResponse({"user": user}, status=200)
+        user = users_col.find_one_and_update(
+            {"_id": user_oid},
+            {"$set": update_fields},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        cache_delete(_user_cache, str(user_oid))
+        if not user:
+            return OrjsonResponse({"error": "Usuario no encontrado"}, status=404)
+        return OrjsonResponse({"user": sanitize_user(user)}, status=200)
+    except DuplicateKeyError as e:
+        return duplicate_user_response(e)
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("Error en update_user")
+        return OrjsonResponse({"error": str(e)}, status=500)
 
 
 # Eliminar usuario por ID (solo admin)
@@ -224,15 +352,20 @@ def update_user(request, user_id):
 @csrf_exempt
 def delete_user(request, user_id):
     if request.method != "DELETE":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
     try:
-        result = users_col.delete_one({"_id": ObjectId(user_id)})
+        user_oid = ObjectId(user_id)
+    except InvalidId:
+        return OrjsonResponse({"error": "ID de usuario inválido"}, status=400)
+    try:
+        result = users_col.delete_one({"_id": user_oid})
+        cache_delete(_user_cache, str(user_oid))
         if result.deleted_count == 0:
-            return JsonResponse({"error": "Usuario no encontrado"}, status=404)
-        return JsonResponse({"message": "Usuario eliminado"}, status=200)
+            return OrjsonResponse({"error": "Usuario no encontrado"}, status=404)
+        return OrjsonResponse({"message": "Usuario eliminado"}, status=200)
     except Exception as e:
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+        logger.exception("Error en delete_user")
+        return OrjsonResponse({"error": str(e)}, status=500)
     
 
 def get_climate_data(request):
@@ -240,7 +373,7 @@ def get_climate_data(request):
     Obtener datos climáticos con filtros opcionales
     Query params:
         ?userId=<id>
-        ?fecha=<YYYY-MM-DD>
+        ?fecha=<YYYY-MM-DD | YYYY-MM | YYYY>
         ?lugar=<texto>
         ?variable=<nombre_variable>
     """
@@ -261,60 +394,71 @@ def get_climate_data(request):
         # Filtro por FECHA en la serie temporal
         # La serie temporal contiene los datos climáticos históricos con sus fechas específicas
         # Ejemplo: serieTemporal: [{date: "2025-11-15", value: "18.5"}, {date: "2025-11-16", value: "19.2"}]
+        # Cada punto guarda además 'timestamp' (Date, indexado; los registros antiguos lo
+        # reciben con `manage.py migrate_mongo`): se filtra por rango sobre ese campo.
         if fecha:
-            try:
+            rango = fecha_range(fecha)
+            if rango:
                 # Buscar registros que contengan la fecha en su serieTemporal
+                # ($elemMatch: ambos límites sobre el mismo punto, con límites de índice ajustados)
                 query['datosClimaticos.serieTemporal'] = {
-                    '$elemMatch': {
-                        'date': {'$regex': f'^{fecha}', '$options': 'i'}
-                    }
+                    '$elemMatch': {'timestamp': {'$gte': rango[0], '$lt': rango[1]}}
                 }
-                print(f"📅 Buscando registros con datos en la fecha: {fecha} (en serieTemporal)")
-            except Exception as e:
-                print(f"⚠️ Error procesando filtro de fecha: {e}")
-                pass  # Si hay error, ignorar el filtro
+                logger.debug("Buscando registros con datos en la fecha: %s (en serieTemporal)", fecha)
+            else:
+                logger.warning("Filtro de fecha no válido, se ignora: %s", fecha)
 
-        # Filtro por lugar (búsqueda parcial, case-insensitive)
+        # Filtro por lugar (búsqueda parcial, case-insensitive).
+        # Se escapa el texto: caracteres como '(' o '.' se buscan literalmente.
         if lugar:
-            query['consulta.lugar'] = {'$regex': lugar, '$options': 'i'}
+            query['consulta.lugar'] = Regex(re.escape(lugar), 'i')
 
         # Filtro por variable (búsqueda exacta)
         if variable:
             query['consulta.variable'] = variable
 
-        print(f"🔍 Query MongoDB: {query}")
+        logger.debug("Query MongoDB: %s", query)
 
         # Obtener datos con _id incluido para poder eliminar
-        data = []
-        for doc in climate_data_col.find(query):
-            doc['_id'] = str(doc['_id'])  # Convertir ObjectId a string
-
-            # DEBUG: Mostrar fechaDatos de cada documento encontrado
-            if fecha:
-                fecha_datos = doc.get('estadoDatos', {}).get('fechaDatos', 'N/A')
-                print(f"  📋 Doc encontrado - estadoDatos.fechaDatos: {fecha_datos}")
-
-            data.append(doc)
-
-        print(f"✅ Documentos encontrados: {len(data)}")
-
-        # DEBUG EXTRA: Si se buscó por fecha y no hay resultados, mostrar un documento de ejemplo
-        if fecha and len(data) == 0:
-            sample = climate_data_col.find_one({'usuario._id': user_id} if user_id else {})
-            if sample:
-                print(f"⚠️ NO se encontraron resultados para fecha: {fecha}")
-                print(f"   Ejemplo de documento en BD - estadoDatos.fechaDatos: {sample.get('estadoDatos', {}).get('fechaDatos', 'N/A')}")
-                # Mostrar también las primeras fechas de la serie temporal
-                serie = sample.get('datosClimaticos', {}).get('serieTemporal', [])
-                if serie and len(serie) > 0:
-                    print(f"   Primera fecha en serieTemporal: {serie[0].get('date', 'N/A')}")
-                    print(f"   Última fecha en serieTemporal: {serie[-1].get('date', 'N/A')}")
-
-        return JsonResponse({"status": "success", "data": data}, safe=False)
+        # 'timestamp' es solo para consultar; la respuesta mantiene el formato original
+        cursor = climate_data_col.find(query, {'datosClimaticos.serieTemporal.timestamp': 0}).batch_size(1000)
+        # find es perezoso: se lee el primer documento aquí para que un error de MongoDB
+        # dé un 500 en JSON y no una respuesta 200 truncada
+        first_doc = next(cursor, None)
+
+        # Se serializa documento a documento: memoria constante y primer byte inmediato
+        def stream():
+            yield b'{"status":"success","data":['
+            count = 0
+            if first_doc is not None:
+                for doc in itertools.chain((first_doc,), cursor):
+                    if count:
+                        yield b','
+                    doc['_id'] = str(doc['_id'])  # Convertir ObjectId a string
+                    yield orjson.dumps(doc, default=str)
+                    count += 1
+            yield b']}'
+
+            logger.debug("Documentos encontrados: %d", count)
+
+            # DEBUG EXTRA: Si se buscó por fecha y no hay resultados, mostrar un documento de ejemplo
+            # (consulta adicional: solo con el nivel DEBUG activo)
+            if fecha and count == 0 and logger.isEnabledFor(logging.DEBUG):
+                sample = climate_data_col.find_one({'usuario._id': user_id} if user_id else {})
+                if sample:
+                    serie = sample.get('datosClimaticos', {}).get('serieTemporal', [])
+                    logger.debug(
+                        "Sin resultados para fecha %s. Ejemplo en BD - estadoDatos.fechaDatos: %s, serieTemporal: %s .. %s",
+                        fecha,
+                        sample.get('estadoDatos', {}).get('fechaDatos', 'N/A'),
+                        serie[0].get('date', 'N/A') if serie else 'N/A',
+                        serie[-1].get('date', 'N/A') if serie else 'N/A',
+                    )
+
+        return StreamingHttpResponse(stream(), content_type="application/json")
     except Exception as e:
-        import traceback
-        print("❌ ERROR en get_climate_data:", traceback.format_exc())
-        return JsonResponse({"status": "error", "message": str(e)}, status=500)
+        logger.exception("Error en get_climate_data")
+        return OrjsonResponse({"status": "error", "message": str(e)}, status=500)
 
 
 @csrf_exempt
@@ -324,53 +468,52 @@ def save_climate_data(request):
     Guardar nuevos datos climáticos en MongoDB
     """
     if request.method != "POST":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
 
     try:
         body = json.loads(request.body)
 
         # Validar datos requeridos
         if not body.get("usuario") or not body.get("consulta") or not body.get("datosClimaticos"):
-            return JsonResponse({"error": "Faltan datos requeridos"}, status=400)
+            return OrjsonResponse({"error": "Faltan datos requeridos"}, status=400)
+
+        # Fecha de cada punto de la serie como Date (para el filtro por fecha indexado).
+        # Si no se puede interpretar queda en null, igual que en `manage.py migrate_mongo`.
+        serie = body["datosClimaticos"].get("serieTemporal") if isinstance(body["datosClimaticos"], dict) else None
+        puntos = [p for p in serie if isinstance(p, dict)] if isinstance(serie, list) else []
+        for punto in puntos:
+            punto["timestamp"] = parse_serie_date(punto.get("date"))
 
         # DEBUG: Verificar datos del usuario que se van a guardar
-        print(f"\n{'='*80}")
-        print(f"💾 DEBUG - save_climate_data - Guardando registro:")
-        print(f"{'='*80}")
-        print(f"Usuario recibido del frontend:")
-        import pprint
-        pprint.pprint(body.get("usuario", {}))
-        print(f"\nUsuario del JWT (quien está guardando):")
-        print(f"  user_id: {request.user.get('user_id')}")
-        print(f"  email: {request.user.get('email')}")
-        print(f"  role: {request.user.get('role')}")
+        logger.debug(
+            "save_climate_data - usuario recibido: %s; usuario del JWT: user_id=%s email=%s role=%s",
+            body.get("usuario", {}), request.user.get("user_id"), request.user.get("email"), request.user.get("role")
+        )
 
         # SOLUCIÓN: Sobrescribir el _id del usuario con el del JWT para garantizar consistencia
         # Esto asegura que siempre se guarde el ID correcto del usuario autenticado
         body["usuario"]["_id"] = request.user.get("user_id")
 
-        print(f"\n✅ _id del usuario sobrescrito con el del JWT: {body['usuario']['_id']}")
-        print(f"{'='*80}\n")
-
         # Agregar timestamp de creación
-        body["createdAt"] = datetime.utcnow().isoformat()
+        body["createdAt"] = datetime.now(timezone.utc).isoformat()
 
         # Insertar en MongoDB
         result = climate_data_col.insert_one(body)
 
-        # Preparar respuesta
+        # Preparar respuesta ('timestamp' es interno: GET tampoco lo devuelve)
         body["_id"] = str(result.inserted_id)
+        for punto in puntos:
+            punto.pop("timestamp", None)
 
-        return JsonResponse({
+        return OrjsonResponse({
             "status": "success",
             "message": "Datos guardados exitosamente",
             "data": body
         }, status=201)
 
     except Exception as e:
-        import traceback
-        print("❌ ERROR en save_climate_data:", traceback.format_exc())
-        return JsonResponse({"error": f"Error al guardar datos: {str(e)}"}, status=500)
+        logger.exception("Error en save_climate_data")
+        return OrjsonResponse({"error": f"Error al guardar datos: {str(e)}"}, status=500)
 
 
 @csrf_exempt
@@ -381,55 +524,47 @@ def delete_climate_data(request, record_id):
     Solo el usuario dueño del registro o un admin puede eliminar
     """
     if request.method != "DELETE":
-        return JsonResponse({"error": "Método no permitido"}, status=405)
+        return OrjsonResponse({"error": "Método no permitido"}, status=405)
+
+    try:
+        record_oid = ObjectId(record_id)
+    except InvalidId:
+        return OrjsonResponse({"error": "ID de registro inválido"}, status=400)
 
     try:
         # Obtener el registro para verificar permisos
-        record = climate_data_col.find_one({"_id": ObjectId(record_id)})
+        record = climate_data_col.find_one({"_id": record_oid})
 
         if not record:
-            return JsonResponse({"error": "Registro no encontrado"}, status=404)
-
-        # Debugging completo del registro
-        print(f"\n{'='*80}")
-        print(f"🔍 DEBUG - ESTRUCTURA COMPLETA DEL REGISTRO:")
-        print(f"{'='*80}")
-        print(f"Record ID: {record_id}")
-        print(f"\nUsuario completo en record:")
-        import pprint
-        pprint.pprint(record.get("usuario", {}))
+            return OrjsonResponse({"error": "Registro no encontrado"}, status=404)
 
         # Verificar que el usuario es dueño del registro o es admin
         user_id = str(request.user.get("user_id"))  # Convertir a string
         record_owner_id = str(record.get("usuario", {}).get("_id", ""))  # Convertir a string
         is_admin = request.user.get("role") == "admin"
 
-        # Debugging: imprimir IDs para verificar comparación
-        print(f"\n🔍 DEBUG - Verificando permisos:")
-        print(f"   User ID del JWT: '{user_id}' (tipo: {type(user_id)}, len: {len(user_id)})")
-        print(f"   Owner ID del registro: '{record_owner_id}' (tipo: {type(record_owner_id)}, len: {len(record_owner_id)})")
-        print(f"   Es admin: {is_admin}")
-        print(f"   ¿Son iguales?: {user_id == record_owner_id}")
-        print(f"   Comparación byte a byte: {[ord(c) for c in user_id[:10]]} vs {[ord(c) for c in record_owner_id[:10]]}")
-        print(f"{'='*80}\n")
+        # Debugging: IDs usados en la comparación de permisos
+        logger.debug(
+            "delete_climate_data %s - user_id JWT: %r, owner: %r, admin: %s",
+            record_id, user_id, record_owner_id, is_admin
+        )
 
         # Comparar como strings para evitar problemas de tipo
         if user_id != record_owner_id and not is_admin:
             error_msg = f"No tiene permisos para eliminar este registro. Su ID: {user_id}, Owner ID: {record_owner_id}"
-            print(f"❌ {error_msg}")
-            return JsonResponse({"error": error_msg}, status=403)
+            logger.info(error_msg)
+            return OrjsonResponse({"error": error_msg}, status=403)
 
         # Eliminar registro
-        result = climate_data_col.delete_one({"_id": ObjectId(record_id)})
+        result = climate_data_col.delete_one({"_id": record_oid})
 
         if result.deleted_count == 0:
-            return JsonResponse({"error": "No se pudo eliminar el registro"}, status=500)
+            return OrjsonResponse({"error": "No se pudo eliminar el registro"}, status=500)
 
-        print(f"✅ Registro {record_id} eliminado por usuario {user_id}")
-        return JsonResponse({"message": "Registro eliminado exitosamente", "deleted_count": result.deleted_count}, status=200)
+        logger.info("Registro %s eliminado por usuario %s", record_id, user_id)
+        return OrjsonResponse({"message": "Registro eliminado exitosamente", "deleted_count": result.deleted_count}, status=200)
 
     except Exception as e:
-        import traceback
-        print("❌ ERROR en delete_climate_data:", traceback.format_exc())
-        return JsonResponse({"error": f"Error al eliminar registro: {str(e)}"}, status=500)
+        logger.exception("Error en delete_climate_data")
+        return OrjsonResponse({"error": f"Error al eliminar registro: {str(e)}"}, status=500)
     
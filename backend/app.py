@@ -1,34 +1,63 @@
 # backend/app.py
 from flask import Flask, jsonify, request
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-from pymongo import MongoClient
+import orjson
+import os
+import pymongo
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import PyMongoError
 
 # 🔹 1. Crear la aplicación Flask
+class OrjsonProvider(JSONProvider):
+    """jsonify y request.json con orjson (extensión en C) en vez del json estándar."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 # 🔹 2. Conexión con MongoDB
-client = MongoClient("mongodb://localhost:27017/")
+# Compresión de protocolo (zstd si está instalado, zlib siempre disponible), como en
+# api/mongodb.py; pool amplio para los hilos de gunicorn (gthread)
+client = MongoClient("mongodb://localhost:27017/", maxPoolSize=100, compressors="zstd,zlib")
 db = client["climetricabd"]
 collection = db["datasets"]
 
+# Datos de ejemplo por tipo de capa (estáticos)
+CLIMATE_SAMPLES = {
+    "temperature": {"type": "FeatureCollection", "features": [{"id": 1, "value": 27.5}]},
+    "precipitation": {"type": "FeatureCollection", "features": [{"id": 2, "value": 15.2}]},
+    "soil_moisture": {"type": "FeatureCollection", "features": [{"id": 3, "value": 0.45}]},
+    "drought": {"type": "FeatureCollection", "features": [{"id": 4, "value": 0.3}]},
+}
+
+# download_layer busca por 'layer': índice para no recorrer toda la colección.
+# Las capas de ejemplo se guardan una sola vez al arrancar ($setOnInsert no pisa
+# datos existentes), en lugar de insertar un documento nuevo en cada GET.
+try:
+    # límite corto: si MongoDB no está disponible, no bloquear el arranque 30 s
+    with pymongo.timeout(5):
+        collection.create_index("layer")
+        collection.bulk_write([
+            UpdateOne({"layer": layer}, {"$setOnInsert": {"data": data}}, upsert=True)
+            for layer, data in CLIMATE_SAMPLES.items()
+        ], ordered=False)
+except PyMongoError as e:
+    print(f"⚠️ No se pudo preparar la colección de MongoDB: {e}")
+
 # 🔹 3. Rutas de ejemplo para datos climáticos
 @app.route("/api/climate/<layer>", methods=["GET"])
 def get_climate_layer(layer):
-    # Ejemplo de datos según tipo de capa
-    if layer == "temperature":
-        data = {"type": "FeatureCollection", "features": [{"id": 1, "value": 27.5}]}
-    elif layer == "precipitation":
-        data = {"type": "FeatureCollection", "features": [{"id": 2, "value": 15.2}]}
-    elif layer == "soil_moisture":
-        data = {"type": "FeatureCollection", "features": [{"id": 3, "value": 0.45}]}
-    elif layer == "drought":
-        data = {"type": "FeatureCollection", "features": [{"id": 4, "value": 0.3}]}
-    else:
+    data = CLIMATE_SAMPLES.get(layer)
+    if data is None:
         return jsonify({"error": "Layer not found"}), 404
-
-    # Guardamos el JSON en MongoDB
-    collection.insert_one({"layer": layer, "data": data})
     return jsonify(data)
 
 # 🔹 4. Ruta para descargar los datos desde la base
@@ -40,5 +69,8 @@ def download_layer(layer):
     return jsonify({"error": "No data found for this layer"}), 404
 
 # 🔹 5. Arranque del servidor
+# En producción se sirve con gunicorn (2 * núcleos + 1 workers, hilos por worker), desde backend/:
+#   gunicorn -w 9 -k gthread --threads 4 -b 0.0.0.0:5000 app:app
+# El servidor de Werkzeug queda solo para desarrollo; el modo debug se activa con FLASK_DEBUG=1.
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1", threaded=True, port=5000)
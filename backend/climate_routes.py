@@ -1,31 +1,71 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, Response, jsonify, request
 from database import climate_collection
-from datetime import datetime
-import json
-import io
+from datetime import datetime, timezone
+from urllib.parse import quote
+from werkzeug.http import dump_options_header
+import orjson
+import unicodedata
 
 climate_bp = Blueprint("climate", __name__)
 
+# Campos que usa el listado; el documento completo se sirve en /full/<variable>
+SUMMARY_PROJECTION = {"_id": 0, "variable": 1, "timestamp": 1, "data.features.id": 1, "data.features.value": 1}
+
+def _attachment_header(filename):
+    """
+    Content-Disposition de descarga con el nombre bien escapado; si no es ASCII se añade
+    filename* (RFC 6266), igual que hace send_file con download_name.
+    """
+    try:
+        filename.encode("ascii")
+        names = {"filename": filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": simple, "filename*": "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+    return dump_options_header("attachment", names)
+
+def _json_array_response(cursor, **kwargs):
+    """Respuesta JSON (array) serializada documento a documento, sin cargar la lista en memoria."""
+    # find es perezoso: el primer documento se lee antes de responder, para que un error
+    # de MongoDB dé un 500 y no una respuesta 200 truncada
+    first_doc = next(cursor, None)
+
+    def stream():
+        yield b"["
+        if first_doc is not None:
+            yield orjson.dumps(first_doc, default=str)
+            for doc in cursor:
+                yield b","
+                yield orjson.dumps(doc, default=str)
+        yield b"]"
+
+    return Response(stream(), mimetype="application/json", **kwargs)
+
 @climate_bp.route("/<variable>", methods=["GET"])
 def get_climate_data(variable):
-    """Obtiene datos climáticos desde MongoDB."""
-    data = list(climate_collection.find({"variable": variable}, {"_id": 0}))
-    return jsonify(data)
+    """Obtiene datos climáticos desde MongoDB (solo id/valor de cada feature y timestamp)."""
+    cursor = climate_collection.find({"variable": variable}, SUMMARY_PROJECTION).batch_size(1000)
+    return _json_array_response(cursor)
+
+@climate_bp.route("/full/<variable>", methods=["GET"])
+def get_climate_data_full(variable):
+    """Obtiene los documentos completos de una variable."""
+    cursor = climate_collection.find({"variable": variable}, {"_id": 0}).batch_size(1000)
+    return _json_array_response(cursor)
 
 @climate_bp.route("/update", methods=["POST"])
 def update_climate_data():
     """Guarda nuevos datos climáticos (ejemplo para recibir JSON del frontend o API externa)."""
     payload = request.json
-    payload["timestamp"] = datetime.utcnow().isoformat()
+    payload["timestamp"] = datetime.now(timezone.utc).isoformat()
     climate_collection.insert_one(payload)
     return jsonify({"status": "ok", "message": "Datos insertados correctamente"})
 
 @climate_bp.route("/download/<variable>", methods=["GET"])
 def download_variable(variable):
     """Descarga los datos de una variable como archivo JSON."""
-    data = list(climate_collection.find({"variable": variable}, {"_id": 0}))
-    buffer = io.BytesIO()
-    buffer.write(json.dumps(data, indent=2).encode('utf-8'))
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"{variable}_data.json", mimetype="application/json")
-
+    cursor = climate_collection.find({"variable": variable}, {"_id": 0}).batch_size(1000)
+    return _json_array_response(
+        cursor,
+        headers={"Content-Disposition": _attachment_header(f"{variable}_data.json")}
+    )
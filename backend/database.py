@@ -1,6 +1,19 @@
+import pymongo
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 # Conexión a MongoDB local
-client = MongoClient("mongodb://localhost:27017/")
+# Compresión de protocolo (zstd si está instalado, zlib siempre disponible), como en
+# api/mongodb.py; pool amplio para los hilos de gunicorn (gthread)
+client = MongoClient("mongodb://localhost:27017/", maxPoolSize=100, compressors="zstd,zlib")
 db = client["climetricaBD"]
 climate_collection = db["climate_data"]
+
+# Las rutas de clima filtran siempre por 'variable': índice para evitar el recorrido
+# completo de la colección. create_index es idempotente.
+try:
+    # límite corto: si MongoDB no está disponible, no bloquear el arranque 30 s
+    with pymongo.timeout(5):
+        climate_collection.create_index("variable")
+except PyMongoError as e:
+    print(f"⚠️ No se pudo crear el índice de MongoDB: {e}")